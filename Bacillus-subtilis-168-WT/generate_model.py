@@ -4,15 +4,21 @@
 from __future__ import absolute_import, division, print_function
 
 # imports
+import os
+import sys
 import rba
 
+# shared helpers in <repository root>/tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import model_io
+
 
 def main():
     subtilis = rba.RbaModel.from_data('params.in')
     subtilis.set_medium('data/curated_medium.tsv')
     subtilis.set_enzyme_efficiencies('data/catalytic_activity_medium_2.csv')
     add_flagella_constraint(subtilis)
-    subtilis.write()
+    model_io.write_model(subtilis)
 
 
 def add_flagella_constraint(subtilis):
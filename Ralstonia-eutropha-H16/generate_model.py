@@ -4,10 +4,16 @@
 from __future__ import absolute_import, division, print_function
 
 # package imports
+import os
 import re
+import sys
 import rba
 import cobra
 
+# shared helpers in <repository root>/tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import model_io
+
 
 # MAIN FUNCTION --------------------------------------------------------
 #
@@ -39,7 +45,8 @@ def main():
     set_compartment_params(reutropha)
     
     # export to files
-    reutropha.write()
+    # (only files that changed are rewritten)
+    model_io.write_model(reutropha)
 
 
 
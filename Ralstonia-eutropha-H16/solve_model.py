@@ -4,12 +4,19 @@
 from __future__ import division, print_function
 
 # package imports
+import os
+import sys
 import rba
 import re
 import copy
 import numpy as np
 import pandas as pd
 
+# shared helpers in <repository root>/tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import model_io
+from allocation_profile import AllocationProfile
+
 
 def main():
     
@@ -17,8 +24,8 @@ def main():
     xml_dir = 'model/'
     output_dir = 'simulation/mixotrophy/'
     
-    # load model, build matrices
-    model = rba.RbaModel.from_xml(xml_dir)
+    # load model (plain or gzip-compressed XML), build matrices
+    model = model_io.load_model(xml_dir)
     
     # optionally modify medium
     orig_medium = model.medium
@@ -45,6 +52,9 @@ def main():
 
 def simulate_substrate(model, substrate, orig_medium, output_dir):
     
+    # record binding capacity constraints of all simulations
+    profile = AllocationProfile(model)
+    
     # run several simulations in a loop
     for index, row in substrate.iterrows():
         
@@ -72,10 +82,14 @@ def simulate_substrate(model, substrate, orig_medium, output_dir):
                 output_dir = output_dir,
                 output_suffix = '_{}_{}_{}_{}_{}.tsv'.format(*row.to_list()[0:4], index),
                 substrate_TR = row['substrate_TR'],  
-                substrate_MW = row['substrate_MW']
+                substrate_MW = row['substrate_MW'],
+                profile = profile,
+                model = model2
                 )
         except TypeError:
             print('model not solvable due to matrix inconsistency')
+    
+    profile.save(output_dir + 'allocation_profile.npz')
 
 
 def simulate_variability(model, iterations, orig_medium, output_dir):
@@ -84,6 +98,9 @@ def simulate_variability(model, iterations, orig_medium, output_dir):
     model.medium = orig_medium
     completed_cycles = 1
     
+    # record binding capacity constraints of all simulations
+    profile = AllocationProfile(model)
+    
     # run several simulations in a loop
     while completed_cycles <= iterations:
         
@@ -101,18 +118,23 @@ def simulate_variability(model, iterations, orig_medium, output_dir):
                     output_dir = output_dir,
                     output_suffix = '_iteration_{:0>3}.tsv'.format(completed_cycles),
                     substrate_TR = 'R_FORt',
-                    substrate_MW = 0.04603
+                    substrate_MW = 0.04603,
+                    profile = profile,
+                    model = model2
                     )
                 completed_cycles = completed_cycles + 1
             else:
                 print('growth rate is zero, discarding result')
         except TypeError:
             print('model not solvable due to matrix inconsistency')
+    
+    profile.save(output_dir + 'allocation_profile_variability.npz')
 
 
 def report_results(
     result, output_dir, output_suffix,
-    substrate_TR = None, substrate_MW = None):
+    substrate_TR = None, substrate_MW = None,
+    profile = None, model = None):
     
     # calculate yield
     # flux in mmol g_bm^-1 h^-1 needs to be converted to g substrate
@@ -124,6 +146,11 @@ def report_results(
     ds_mem = result.density_status("Cell_membrane")
     ds_cyt = result.density_status("Cytoplasm")
     
+    # optionally record binding capacity constraints of the solved model,
+    # labelled with the condition tag (suffix without file extension)
+    if profile is not None:
+        profile.record(result, model, os.path.splitext(output_suffix)[0].strip('_'))
+    
     # export summary fluxes per reaction
     result.write_fluxes(
         output_dir + 'fluxes' + output_suffix,
@@ -0,0 +1,200 @@
+"""Record which capacity constraints limit growth across a sweep of solves.
+
+For every solved condition, AllocationProfile.record() stores one row of
+a compact structured array:
+
+ - growth rate,
+ - occupancy (usage / capacity) of every compartment density,
+ - concentration and capacity usage of every process machinery
+   (ribosome, chaperones, transcription, replication, ...),
+ - the most abundant enzymes whose efficiency constraints are binding
+   (top enzyme-efficiency bottlenecks).
+
+Capacity usage of a constraint row is 1 - slack / scale, where slack is
+the distance of the row activity A.X from its bound at mu_opt and scale
+the magnitude of the row's terms; a usage of 1 means the constraint is
+binding. The table can be saved, reloaded and sliced over a whole sweep
+without re-solving, e.g. to find the conditions where the set of
+limiting constraints changes:
+
+    profile = AllocationProfile(model)
+    for ...:
+        profile.record(model.solve(), model, label)
+    profile.save('allocation_profile.npz')
+
+    profile = AllocationProfile.load('allocation_profile.npz')
+    profile.binding('machinery')     # conditions x processes, boolean
+    profile.regime_changes()         # indices where limiting set changes
+"""
+
+# python 2 compatibility
+from __future__ import absolute_import, division, print_function
+
+# package imports
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+
+# names of constraint rows in the RBApy constraint matrix
+PROCESS_ROW = '{}_capacity'
+ENZYME_ROWS = ['{}_forward_capacity', '{}_backward_capacity']
+
+
+class AllocationProfile(object):
+
+    def __init__(self, model=None, top_enzymes=10, tolerance=1e-6,
+                 compartments=None, processes=None, enzymes=None):
+        if model is not None:
+            compartments = [d.compartment for d in model.density.target_densities]
+            processes = [p.id for p in model.processes.processes]
+            enzymes = [e.id for e in model.enzymes.enzymes]
+        self.compartments = list(compartments)
+        self.processes = list(processes)
+        self.enzymes = list(enzymes)
+        self.tolerance = tolerance
+        self.dtype = np.dtype([
+            ('mu', 'f8'),
+            ('density', 'f4', (len(self.compartments),)),
+            ('machinery', 'f4', (len(self.processes),)),
+            ('machinery_usage', 'f4', (len(self.processes),)),
+            ('bottleneck', 'i4', (top_enzymes,)),
+            ('bottleneck_concentration', 'f4', (top_enzymes,)),
+        ])
+        self.labels = []
+        self._rows = []
+        self._table = np.zeros(0, self.dtype)
+
+    # RECORDING --------------------------------------------------------
+    #
+    # append one row for 'model' solved into 'result' (rba Results
+    # object). The constraint matrix of the model is rebuilt at mu_opt to
+    # obtain row activities; this is not a solve. Labels are stored as
+    # strings (default: running number).
+    def record(self, result, model, label=None):
+
+        # RBApy is only needed here; saving and querying work without it
+        from rba.core.constraint_matrix import ConstraintMatrix
+
+        matrix = ConstraintMatrix(model)
+        matrix.set_medium(model.medium)
+        matrix.build_matrices(result.mu_opt)
+        X = np.array([result.variables[name] for name in matrix.col_names])
+        self.record_solution(result, matrix, X, label)
+
+    # append one row from a result, the constraint matrix built at
+    # mu_opt and the solution vector X (ordered like matrix.col_names)
+    def record_solution(self, result, matrix, X, label=None):
+
+        row = np.zeros((), self.dtype)
+        row['mu'] = result.mu_opt
+        for i, c in enumerate(self.compartments):
+            capacity, usage = result.density_status(c)
+            row['density'][i] = usage / capacity if capacity else np.nan
+        machinery = result.process_machinery_concentrations()
+        usage = dict(zip(matrix.row_names, row_usage(matrix, X)))
+        for i, p in enumerate(self.processes):
+            row['machinery'][i] = machinery.get(p, np.nan)
+            row['machinery_usage'][i] = usage.get(PROCESS_ROW.format(p), np.nan)
+
+        # binding enzyme efficiency constraints, most abundant enzyme first
+        columns = dict((name, i) for i, name in enumerate(matrix.col_names))
+        binding = [
+            i for i, e in enumerate(self.enzymes)
+            if max(usage.get(r.format(e), 0) for r in ENZYME_ROWS) >= 1 - self.tolerance
+        ]
+        concentrations = np.array([X[columns[self.enzymes[i]]] for i in binding])
+        top = np.argsort(-concentrations)[:len(row['bottleneck'])]
+        row['bottleneck'][:] = -1
+        row['bottleneck'][:len(top)] = np.array(binding, dtype=int)[top]
+        row['bottleneck_concentration'][:len(top)] = concentrations[top]
+
+        self._rows.append(row)
+        self.labels.append(str(len(self.labels) if label is None else label))
+
+    @property
+    def table(self):
+        if self._rows:
+            self._table = np.concatenate([self._table, np.array(self._rows)])
+            self._rows = []
+        return self._table
+
+    def save(self, file_name):
+
+        np.savez_compressed(
+            file_name, table=self.table, labels=np.array(self.labels, dtype=str),
+            compartments=np.array(self.compartments, dtype=str),
+            processes=np.array(self.processes, dtype=str),
+            enzymes=np.array(self.enzymes, dtype=str),
+            tolerance=self.tolerance)
+
+    @classmethod
+    def load(cls, file_name):
+
+        with np.load(file_name) as data:
+            table = data['table']
+            profile = cls(
+                top_enzymes=table.dtype['bottleneck'].shape[0],
+                tolerance=float(data['tolerance']),
+                compartments=data['compartments'].tolist(),
+                processes=data['processes'].tolist(),
+                enzymes=data['enzymes'].tolist())
+            labels = data['labels'].tolist()
+        profile._table = table
+        profile.labels = labels
+        return profile
+
+    # QUERYING ---------------------------------------------------------
+    #
+    # boolean array (conditions x constraints) of binding constraints,
+    # for kind 'density' (compartments) or 'machinery' (processes)
+    def binding(self, kind='density'):
+
+        if kind == 'density':
+            return self.table['density'] >= 1 - self.tolerance
+        if kind == 'machinery':
+            return self.table['machinery_usage'] >= 1 - self.tolerance
+        raise ValueError("kind must be 'density' or 'machinery'.")
+
+    # table of one field (conditions x compartments/processes)
+    def frame(self, field='density'):
+
+        names = self.compartments if field == 'density' else self.processes
+        return pd.DataFrame(self.table[field], index=self.labels, columns=names)
+
+    # enzymes with binding efficiency constraints in one condition, as
+    # (enzyme, concentration) pairs sorted by decreasing concentration
+    def bottlenecks(self, index):
+
+        row = self.table[index]
+        return [
+            (self.enzymes[e], float(c))
+            for e, c in zip(row['bottleneck'], row['bottleneck_concentration'])
+            if e >= 0
+        ]
+
+    # indices of conditions whose set of binding densities and
+    # machineries differs from the previous condition
+    def regime_changes(self):
+
+        state = np.hstack([self.binding('density'), self.binding('machinery')])
+        changed = np.any(state[1:] != state[:-1], axis=1)
+        return np.flatnonzero(changed) + 1
+
+
+# capacity usage 1 - slack / scale of every row of 'matrix' for solution
+# X ('L' rows: A.X <= b, 'G' rows: A.X >= b). Equality rows are always
+# binding; rows without any activity have usage 0.
+def row_usage(matrix, X):
+
+    A = scipy.sparse.csr_matrix(matrix.A)
+    b = np.asarray(matrix.b, dtype=float).ravel()
+    signs = np.asarray(matrix.row_signs)
+    slack = b - A.dot(X)
+    slack[signs == 'G'] *= -1
+    scale = abs(A).dot(np.abs(X)) + np.abs(b)
+    usage = np.zeros(len(b))
+    active = scale > 0
+    usage[active] = 1 - slack[active] / scale[active]
+    usage[signs == 'E'] = 1
+    return usage
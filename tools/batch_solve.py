@@ -0,0 +1,92 @@
+"""Solve an RBA model for many media at once.
+
+RbaModel.solve() rebuilds the constraint matrix for every call, and
+results are read back as one dict per condition. solve_media() builds
+the matrix once, only swaps the medium between solves, and collects
+growth rates, fluxes and enzyme concentrations in dense arrays
+(conditions x reactions/enzymes).
+
+    media = read_media(['medium.tsv', 'medium_acetate.tsv'])
+    res = solve_media(model, media)
+    res.mu_opt          # one growth rate per condition
+    res.fluxes[:, j]    # flux of res.reactions[j] in every condition
+    res.failed          # conditions the model could not be solved in
+"""
+
+# python 2 compatibility
+from __future__ import absolute_import, division, print_function
+
+# package imports
+import collections
+import numpy as np
+import pandas as pd
+
+
+BatchResults = collections.namedtuple(
+    'BatchResults',
+    ['conditions', 'reactions', 'enzymes', 'mu_opt', 'fluxes',
+     'enzyme_concentrations', 'failed'])
+
+
+# read medium files into one table (metabolites x conditions), named
+# after files unless 'conditions' are given
+def read_media(file_names, conditions=None):
+
+    media = [
+        pd.read_csv(f, sep='\t', index_col=0)['Concentration']
+        for f in file_names
+    ]
+    keys = file_names if conditions is None else conditions
+    return pd.concat(media, axis=1, keys=keys)
+
+
+# solve 'model' for every column of 'media' (metabolites x conditions).
+# Metabolites missing from 'media' keep their concentration from
+# model.medium; metabolites unknown to model.medium raise a ValueError.
+# Conditions in which the model cannot be solved get NaN
+# growth rate, fluxes and concentrations and are listed in 'failed'.
+# Remaining keyword arguments are passed to the RBApy solver (e.g.
+# lp_solver, mu_max).
+def solve_media(model, media, **solver_args):
+
+    # RBApy is only needed here; read_media() works without it
+    from rba.core.constraint_matrix import ConstraintMatrix
+    from rba.core.solver import Solver
+
+    unknown = set(media.index) - set(model.medium)
+    if unknown:
+        raise ValueError(
+            'Metabolites not in model medium: {}'.format(
+                ', '.join(sorted(unknown))))
+    matrix = ConstraintMatrix(model)
+    columns = dict((name, i) for i, name in enumerate(matrix.col_names))
+    reactions = [r.id for r in model.metabolism.reactions]
+    enzymes = [e.id for e in model.enzymes.enzymes]
+    reaction_index = np.array([columns[r] for r in reactions], dtype=int)
+    enzyme_index = np.array([columns[e] for e in enzymes], dtype=int)
+
+    conditions = list(media.columns)
+    mu_opt = np.full(len(conditions), np.nan)
+    fluxes = np.full((len(conditions), len(reactions)), np.nan)
+    concentrations = np.full((len(conditions), len(enzymes)), np.nan)
+    failed = []
+    for i, condition in enumerate(conditions):
+        medium = model.medium.copy()
+        medium.update(media[condition].dropna().to_dict())
+        matrix.set_medium(medium)
+        solver = Solver(matrix, **solver_args)
+        try:
+            solver.solve()
+            X = solver.X
+        except TypeError:
+            # matrix inconsistency
+            X = None
+        if X is None:
+            failed.append(condition)
+            continue
+        X = np.asarray(X).ravel()
+        mu_opt[i] = solver.mu_opt
+        fluxes[i] = X[reaction_index]
+        concentrations[i] = X[enzyme_index]
+    return BatchResults(
+        conditions, reactions, enzymes, mu_opt, fluxes, concentrations, failed)
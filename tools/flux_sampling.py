@@ -0,0 +1,252 @@
+"""Flux sampling of the RBA metabolic network and k_app estimation.
+
+The metabolic network of 'metabolism.xml' (internal species only) is
+sampled with artificial centering hit-and-run (ACHR). Chains are advanced
+together as columns of one matrix, and batches of chains run in parallel
+processes. Flux bounds summarized from the samples are divided by enzyme
+abundance to estimate apparent catalytic rates (k_app), which can be
+written straight into the model's parameters.
+
+Typical use (flux bounds in mmol gDCW-1 h-1, abundance in mmol gDCW-1):
+
+    network = stoichiometry(model.metabolism, bounds={'R_FORt': (0, 20)})
+    samples = sample_fluxes(network, n_chains=200, n_samples=100)
+    bounds = flux_bounds(samples, network.reactions)
+    kapp = estimate_kapp(model, bounds, protein_abundance, network.default_bound)
+    set_kapp(model, kapp)
+
+Reactions without measured bounds are only capped by 'default_bound',
+and reactions on thermodynamically infeasible cycles reach flux values
+close to that cap. Such loops must be bounded (or removed) before
+sampling; estimate_kapp() skips reactions whose sampled flux comes close
+to the cap, as their k_app would be meaningless.
+"""
+
+# python 2 compatibility
+from __future__ import absolute_import, division, print_function
+
+# package imports
+import collections
+import multiprocessing
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from scipy.optimize import linprog
+
+
+# directions with smaller components do not limit step length
+TOLERANCE = 1e-9
+
+# number of reactions whose warmup LPs are solved in one task
+WARMUP_CHUNK = 25
+
+Network = collections.namedtuple(
+    'Network', ['S', 'reactions', 'metabolites', 'lb', 'ub', 'default_bound'])
+
+
+# NETWORK --------------------------------------------------------------
+#
+# build the stoichiometry matrix of internal metabolites from an RBA
+# metabolism. Reversible reactions get [-default_bound, default_bound],
+# irreversible ones [0, default_bound], unless overridden in 'bounds'
+# ({reaction: (lower, upper)}), e.g. by measured exchange fluxes.
+def stoichiometry(metabolism, bounds=None, default_bound=1000):
+
+    metabolites = [s.id for s in metabolism.species if not s.boundary_condition]
+    reactions = [r.id for r in metabolism.reactions]
+    index = dict((m, i) for i, m in enumerate(metabolites))
+    S = scipy.sparse.lil_matrix((len(metabolites), len(reactions)))
+    lb = np.empty(len(reactions))
+    ub = np.full(len(reactions), float(default_bound))
+    for j, r in enumerate(metabolism.reactions):
+        for sr in r.reactants:
+            if sr.species in index:
+                S[index[sr.species], j] -= sr.stoichiometry
+        for sr in r.products:
+            if sr.species in index:
+                S[index[sr.species], j] += sr.stoichiometry
+        lb[j] = -default_bound if r.reversible else 0
+    for reaction, (lower, upper) in (bounds or {}).items():
+        j = reactions.index(reaction)
+        lb[j], ub[j] = lower, upper
+    return Network(S.tocsr(), reactions, metabolites, lb, ub, default_bound)
+
+
+# minimize and maximize the flux of selected reactions (all by default,
+# or 'n_reactions' picked at random). The optima are vertices of the
+# flux polytope and serve as warmup points for ACHR. LPs are distributed
+# over the workers of 'pool' if one is given.
+def warmup_points(network, n_reactions=None, seed=None, pool=None):
+
+    n = len(network.reactions)
+    selected = np.arange(n)
+    if n_reactions is not None and n_reactions < n:
+        selected = np.random.RandomState(seed).choice(n, n_reactions, replace=False)
+    if pool is None:
+        points = vertex_points((network, selected))
+    else:
+        # several reactions per task, so that the network is not sent
+        # to a worker for every single LP
+        n_tasks = max(1, len(selected) // WARMUP_CHUNK)
+        tasks = [(network, s) for s in np.array_split(selected, n_tasks)]
+        points = [p for result in pool.map(vertex_points, tasks) for p in result]
+    if not points:
+        raise ValueError('Flux polytope is empty, check flux bounds.')
+    return np.array(points).T
+
+
+# minimize and maximize the flux of each reaction in 'selected'
+def vertex_points(args):
+
+    network, selected = args
+    n = len(network.reactions)
+    b_eq = np.zeros(network.S.shape[0])
+    bounds = list(zip(network.lb, network.ub))
+    points = []
+    for j in selected:
+        for sign in [1, -1]:
+            c = np.zeros(n)
+            c[j] = sign
+            res = linprog(
+                c, A_eq=network.S, b_eq=b_eq, bounds=bounds, method='highs')
+            if res.status == 0:
+                points.append(res.x)
+    return points
+
+
+# SAMPLING -------------------------------------------------------------
+#
+# sample 'n_samples' points from each of 'n_chains' chains, storing one
+# point every 'thinning' steps. Unless 'warmup' points are given, they
+# are computed from 'n_warmup' randomly picked reactions (None for all
+# reactions, which takes two LPs per reaction). Warmup LPs and equal
+# batches of chains run in 'processes' parallel processes. Returns an
+# array of shape (reactions x samples).
+def sample_fluxes(
+    network, n_chains=100, n_samples=100, thinning=100,
+    warmup=None, n_warmup=200, processes=None, seed=0):
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, n_chains))
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        if warmup is None:
+            warmup = warmup_points(network, n_warmup, seed, pool)
+        batches = [
+            (warmup, network.lb, network.ub, len(chains), n_samples, thinning, seed + i)
+            for i, chains in enumerate(np.array_split(np.arange(n_chains), processes))
+        ]
+        if pool is None:
+            results = [achr_chains(batches[0])]
+        else:
+            results = pool.map(achr_chains, batches)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return np.hstack(results)
+
+
+# run a batch of ACHR chains. Arguments are packed in one tuple so that
+# the function can be dispatched to worker processes.
+def achr_chains(args):
+
+    warmup, lb, ub, n_chains, n_samples, thinning, seed = args
+    rng = np.random.RandomState(seed)
+    n_points = warmup.shape[1]
+    center = warmup.mean(axis=1)
+    n_center = n_points
+
+    # start chains at random convex combinations of warmup points
+    x = warmup.dot(rng.dirichlet(np.ones(n_points), n_chains).T)
+    samples = np.empty((warmup.shape[0], n_chains * n_samples))
+    for i in range(n_samples):
+        for _ in range(thinning):
+            # ACHR direction: random warmup point relative to the center
+            d = warmup[:, rng.randint(n_points, size=n_chains)] - center[:, None]
+            norm = np.linalg.norm(d, axis=0)
+            d /= np.where(norm > TOLERANCE, norm, 1)
+            lower, upper = step_range(x, d, lb, ub)
+            x = x + (lower + rng.rand(n_chains) * (upper - lower)) * d
+
+            # running mean of all visited points
+            center = (n_center * center + x.sum(axis=1)) / (n_center + n_chains)
+            n_center += n_chains
+        samples[:, i * n_chains:(i + 1) * n_chains] = x
+    return samples
+
+
+# smallest and largest step along directions 'd' that keeps points 'x'
+# within flux bounds (one value per chain). Chains whose direction has
+# no moving component (e.g. when bounds pin all fluxes) do not move.
+def step_range(x, d, lb, ub):
+
+    moving = np.abs(d) > TOLERANCE
+    safe_d = np.where(moving, d, 1)
+    to_lb = (lb[:, None] - x) / safe_d
+    to_ub = (ub[:, None] - x) / safe_d
+    upper = np.where(moving, np.maximum(to_lb, to_ub), np.inf).min(axis=0)
+    lower = np.where(moving, np.minimum(to_lb, to_ub), -np.inf).max(axis=0)
+
+    stuck = ~moving.any(axis=0)
+    upper[stuck] = lower[stuck] = 0
+
+    # points drifting slightly out of bounds must not move further out
+    return np.minimum(lower, 0), np.maximum(upper, 0)
+
+
+# K_APP ESTIMATION -----------------------------------------------------
+#
+# summarize sampled fluxes by their lower and upper quantile and median
+def flux_bounds(samples, reactions, quantiles=(0.025, 0.975)):
+
+    lower, median, upper = np.percentile(
+        samples, [100 * quantiles[0], 50, 100 * quantiles[1]], axis=1)
+    return pd.DataFrame(
+        {'lower': lower, 'median': median, 'upper': upper},
+        index=reactions, columns=['lower', 'median', 'upper'])
+
+
+# k_app = maximal absolute flux / enzyme abundance. Enzyme abundance is
+# the abundance of its least abundant subunit divided by the subunit's
+# stoichiometry. Enzymes with unmeasured subunits or without flux are
+# skipped, as are reactions whose flux reaches 'cap_margin' times the
+# flux cap of the network ('default_bound', see module docstring).
+# Returns a series indexed by enzyme ID.
+def estimate_kapp(model, bounds, protein_abundance, flux_cap, cap_margin=0.9):
+
+    kapp = {}
+    for e in model.enzymes.enzymes:
+        if e.reaction not in bounds.index:
+            continue
+        subunits = e.machinery_composition.reactants
+        if not subunits or any(r.species not in protein_abundance for r in subunits):
+            continue
+        abundance = min(protein_abundance[r.species] / r.stoichiometry for r in subunits)
+        flux = bounds.loc[e.reaction, ['lower', 'upper']].abs().max()
+        if flux >= cap_margin * flux_cap:
+            continue
+        if abundance > 0 and flux > 0:
+            kapp[e.id] = flux / abundance
+    return pd.Series(kapp, name='kapp')
+
+
+# set estimated k_app as forward and backward efficiency of enzymes
+def set_kapp(model, kapp):
+
+    # RBApy is only needed here; sampling and estimation work without it
+    import rba
+
+    for enzyme_id, value in kapp.items():
+        e = model.enzymes.enzymes.get_by_id(enzyme_id)
+        id_eff = enzyme_id + '_kapp'
+        fn = model.parameters.functions.get_by_id(id_eff)
+        if fn:
+            fn.parameters.get_by_id('CONSTANT').value = value
+        else:
+            model.parameters.functions.append(
+                rba.xml.Function(id_eff, 'constant', {'CONSTANT': value})
+            )
+        e.forward_efficiency = id_eff
+        e.backward_efficiency = id_eff
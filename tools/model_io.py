@@ -0,0 +1,340 @@
+"""Change-only, optionally compressed reading and writing of RBA models.
+
+RbaModel.write() rewrites every XML file of a model, even if a
+customization only touched one of them. write_model() lets RBApy write
+the model to a temporary directory, compares each file with what is on
+disk and only rewrites files whose content changed. XML files can be
+stored plain or gzip-compressed ('*.xml.gz').
+
+RbaModel.from_xml() cannot read compressed files: models written with
+compress=True must be loaded with load_model(), which reads plain and
+compressed files transparently.
+
+Parameterized variants of a model can be stored as overlays: small XML
+files containing only the elements (matched by id) that differ from a
+base model, instead of full copies of the component.
+"""
+
+# python 2 compatibility
+from __future__ import absolute_import, division, print_function
+
+# package imports
+import os
+import gzip
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+
+
+# tags and attributes used in overlay files
+OVERLAY_TAG = 'RBAOverlay'
+REMOVED_TAG = 'removed'
+AFTER_ATTRIBUTE = 'overlayAfter'
+
+
+# READING --------------------------------------------------------------
+#
+# load a model from plain or compressed files, optionally applying
+# overlays stored in a separate directory. Files are restored to a
+# temporary directory and read with RbaModel.from_xml(), so that every
+# file RBApy knows about is loaded. A model loaded with an overlay has
+# no output directory, so that write_model() cannot overwrite the base
+# model by accident; save it with write_overlay() instead.
+def load_model(xml_dir, overlay_dir=None):
+
+    # RBApy is only needed here; the file and overlay helpers below
+    # work without it
+    import rba
+
+    compressed = [f for f in os.listdir(xml_dir) if f.endswith('.gz')]
+    if overlay_dir is None and not compressed:
+        return rba.RbaModel.from_xml(xml_dir)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        restore_files(xml_dir, tmp_dir, overlay_dir)
+        model = rba.RbaModel.from_xml(tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir)
+    model.output_dir = xml_dir if overlay_dir is None else None
+    return model
+
+
+# copy model files (*.xml, *.tsv, plain or compressed) from 'xml_dir' to
+# 'output_dir', decompressing them and applying overlays on the way.
+# Overlays of XML files are merged, other overlay files replace the base.
+def restore_files(xml_dir, output_dir, overlay_dir=None):
+
+    base_files = model_files(xml_dir)
+    if overlay_dir is not None:
+        unknown = set(model_files(overlay_dir)) - set(base_files)
+        if unknown:
+            raise ValueError(
+                'Overlay files without base model file: {}'.format(
+                    ', '.join(sorted(unknown))))
+    for file_name in base_files:
+        content = read_file(xml_dir, file_name)
+        if overlay_dir is not None:
+            overlay = read_file(overlay_dir, file_name, required=False)
+            if overlay is None:
+                pass
+            elif file_name.endswith('.xml'):
+                content = apply_overlay(content, overlay)
+            else:
+                content = overlay
+        with open(os.path.join(output_dir, file_name), 'wb') as f:
+            f.write(content)
+
+
+# names (without '.gz') of model files in 'directory'
+def model_files(directory):
+
+    names = set()
+    for f in os.listdir(directory):
+        name = f[:-3] if f.endswith('.gz') else f
+        if (name.endswith('.xml') or name.endswith('.tsv')) and \
+                os.path.isfile(os.path.join(directory, f)):
+            names.add(name)
+    return sorted(names)
+
+
+# return raw content of 'file_name' or 'file_name.gz' in 'directory'
+def read_file(directory, file_name, required=True):
+
+    plain = os.path.join(directory, file_name)
+    if os.path.isfile(plain):
+        with open(plain, 'rb') as f:
+            return f.read()
+    if os.path.isfile(plain + '.gz'):
+        with gzip.open(plain + '.gz', 'rb') as f:
+            return f.read()
+    if required:
+        raise IOError('Neither {0} nor {0}.gz found.'.format(plain))
+    return None
+
+
+# WRITING --------------------------------------------------------------
+#
+# write only those model files whose content differs from the version
+# on disk. Only XML files are compressed. Returns the list of files that
+# were (re)written.
+def write_model(model, output_dir=None, compress=False):
+
+    if output_dir is None:
+        output_dir = model.output_dir
+    if output_dir is None:
+        raise ValueError(
+            'Model has no output directory (loaded with an overlay?): '
+            'pass output_dir or use write_overlay().')
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    written = []
+    for file_name, content in rendered_files(model):
+        if write_if_changed(output_dir, file_name, content,
+                            compress and file_name.endswith('.xml')):
+            written.append(file_name)
+    return written
+
+
+# write model files as overlays relative to the model stored in
+# 'base_dir'. Files identical to the base are not written at all.
+def write_overlay(model, base_dir, overlay_dir, compress=False):
+
+    if not os.path.isdir(overlay_dir):
+        os.makedirs(overlay_dir)
+    written = []
+    for file_name, content in rendered_files(model):
+        base = read_file(base_dir, file_name, required=False)
+        if base is None:
+            raise ValueError('{} missing from base model.'.format(file_name))
+        if file_name.endswith('.xml'):
+            overlay = make_overlay(base, content)
+        else:
+            overlay = None if base == content else content
+        if overlay is None:
+            remove_file(overlay_dir, file_name)
+        elif write_if_changed(overlay_dir, file_name, overlay,
+                              compress and file_name.endswith('.xml')):
+            written.append(file_name)
+    return written
+
+
+# (file name, content) of every file written by RbaModel.write()
+def rendered_files(model):
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        model.write(tmp_dir)
+        files = []
+        for file_name in sorted(os.listdir(tmp_dir)):
+            with open(os.path.join(tmp_dir, file_name), 'rb') as f:
+                files.append((file_name, f.read()))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return files
+
+
+# write content unless the file on disk already holds the same content.
+# A stale copy with the other compression setting is removed.
+def write_if_changed(directory, file_name, content, compress):
+
+    path = os.path.join(directory, file_name)
+    target, stale = (path + '.gz', path) if compress else (path, path + '.gz')
+    if os.path.isfile(stale):
+        os.remove(stale)
+    elif os.path.isfile(target):
+        if read_file(directory, file_name) == content:
+            return False
+    if compress:
+        # fixed mtime keeps compressed files reproducible
+        with open(target, 'wb') as raw:
+            with gzip.GzipFile(file_name, 'wb', fileobj=raw, mtime=0) as f:
+                f.write(content)
+    else:
+        with open(target, 'wb') as f:
+            f.write(content)
+    return True
+
+
+def remove_file(directory, file_name):
+
+    path = os.path.join(directory, file_name)
+    for p in [path, path + '.gz']:
+        if os.path.isfile(p):
+            os.remove(p)
+
+
+# OVERLAYS -------------------------------------------------------------
+#
+# An overlay mirrors the structure of a component file. For every list
+# (e.g. 'listOfFunctions') it contains the elements that were added or
+# changed, plus one <removed id="..."/> element per deleted entry. Lists
+# whose elements have no 'id' attribute are stored completely. Added
+# elements (and added lists) carry the id (tag) of their predecessor in
+# an 'overlayAfter' attribute, so that they are restored in place.
+def make_overlay(base_content, content):
+
+    base = ET.fromstring(base_content)
+    new = ET.fromstring(content)
+    overlay = ET.Element(OVERLAY_TAG, {'root': new.tag})
+    base_lists = dict((child.tag, child) for child in base)
+    previous_list = ''
+    for new_list in new:
+        base_list = base_lists.pop(new_list.tag, None)
+        if base_list is None:
+            new_list.set(AFTER_ATTRIBUTE, previous_list)
+            overlay.append(new_list)
+        elif not has_ids(new_list) or not has_ids(base_list):
+            if not same_element(base_list, new_list):
+                overlay.append(new_list)
+        else:
+            diff = list_overlay(base_list, new_list)
+            if len(diff):
+                overlay.append(diff)
+        previous_list = new_list.tag
+    for tag in base_lists:
+        ET.SubElement(overlay, REMOVED_TAG, {'id': tag})
+    if not len(overlay):
+        return None
+    indent(overlay)
+    return ET.tostring(overlay, encoding='utf-8')
+
+
+# added or changed elements of one list, followed by removed ids
+def list_overlay(base_list, new_list):
+
+    diff = ET.Element(new_list.tag)
+    base_items = dict((e.get('id'), e) for e in base_list)
+    previous = ''
+    for e in new_list:
+        base_item = base_items.pop(e.get('id'), None)
+        if base_item is None:
+            e.set(AFTER_ATTRIBUTE, previous)
+            diff.append(e)
+        elif not same_element(base_item, e):
+            diff.append(e)
+        previous = e.get('id')
+    for id_ in base_items:
+        ET.SubElement(diff, REMOVED_TAG, {'id': id_})
+    return diff
+
+
+def apply_overlay(base_content, overlay_content):
+
+    base = ET.fromstring(base_content)
+    overlay = ET.fromstring(overlay_content)
+    for diff in overlay:
+        if diff.tag == REMOVED_TAG:
+            base.remove(base.find(diff.get('id')))
+            continue
+        base_list = base.find(diff.tag)
+        if base_list is None:
+            insert_after(base, diff, lambda e: e.tag)
+        elif not has_ids(diff, ignore_removed=True) or not has_ids(base_list):
+            base[list(base).index(base_list)] = diff
+        else:
+            # replace changed elements before insertions shift positions
+            positions = dict((e.get('id'), i) for i, e in enumerate(base_list))
+            removed = set()
+            added = []
+            for e in diff:
+                if e.tag == REMOVED_TAG:
+                    removed.add(e.get('id'))
+                elif e.get('id') in positions:
+                    base_list[positions[e.get('id')]] = e
+                else:
+                    added.append(e)
+            for e in added:
+                insert_after(base_list, e, lambda e: e.get('id'))
+            for e in [e for e in base_list if e.get('id') in removed]:
+                base_list.remove(e)
+    indent(base)
+    return ET.tostring(base, encoding='utf-8')
+
+
+# insert 'element' into 'parent' after the child whose key matches the
+# element's 'overlayAfter' attribute (first if empty). Elements without
+# the attribute are appended.
+def insert_after(parent, element, key):
+
+    after = element.attrib.pop(AFTER_ATTRIBUTE, None)
+    if after is None:
+        parent.append(element)
+    elif after == '':
+        parent.insert(0, element)
+    else:
+        keys = [key(e) for e in parent]
+        parent.insert(keys.index(after) + 1, element)
+
+
+def has_ids(element, ignore_removed=False):
+
+    return all(
+        e.get('id') is not None for e in element
+        if not (ignore_removed and e.tag == REMOVED_TAG)
+    )
+
+
+def same_element(a, b):
+
+    if a is None or b is None:
+        return a is b
+    return (
+        a.tag == b.tag and a.attrib == b.attrib and
+        (a.text or '').strip() == (b.text or '').strip() and
+        len(a) == len(b) and all(same_element(x, y) for x, y in zip(a, b))
+    )
+
+
+# pretty-print an element tree in place (ElementTree.indent is python >= 3.9)
+def indent(element, level=0):
+
+    pad = '\n' + level * '  '
+    if len(element):
+        if not (element.text or '').strip():
+            element.text = pad + '  '
+        for child in element:
+            indent(child, level + 1)
+        if not (child.tail or '').strip():
+            child.tail = pad
+    if level and not (element.tail or '').strip():
+        element.tail = pad
@@ -0,0 +1,6 @@
+"""Make the modules in tools/ importable from the tests."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
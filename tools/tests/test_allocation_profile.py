@@ -0,0 +1,132 @@
+"""Tests for recording and querying an AllocationProfile."""
+
+import sys
+import types
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from allocation_profile import AllocationProfile, row_usage
+
+
+COLUMNS = ['R_a', 'e1', 'e2', 'e3', 'P_TA', 'P_CHP']
+
+
+class FakeMatrix(object):
+    """Constraint rows (all A.X <= 0 except one equality):
+
+    P_TA_capacity:         R_a - 10 P_TA <= 0
+    P_CHP_capacity:  0.1 R_a - 10 P_CHP <= 0
+    e<i>_*_capacity:       R_a - 100 e<i> <= 0
+    M_x:                   R_a - R_a = 0
+    """
+
+    def __init__(self, model=None):
+        self.col_names = list(COLUMNS)
+        self.row_names = [
+            'P_TA_capacity', 'P_CHP_capacity', 'e1_forward_capacity',
+            'e2_backward_capacity', 'e3_forward_capacity', 'M_x']
+        self.A = np.array([
+            [1, 0, 0, 0, -10, 0],
+            [0.1, 0, 0, 0, 0, -10],
+            [1, -100, 0, 0, 0, 0],
+            [1, 0, -100, 0, 0, 0],
+            [1, 0, 0, -100, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+        ])
+        self.b = np.zeros(6)
+        self.row_signs = ['L'] * 5 + ['E']
+        self.calls = []
+
+    def set_medium(self, medium):
+        self.calls.append(('set_medium', medium))
+
+    def build_matrices(self, mu):
+        self.calls.append(('build_matrices', mu))
+
+
+def solution(flux, ribosome, e1, e2, e3):
+    return np.array([flux, e1, e2, e3, ribosome, 1.0])
+
+
+def result(mu, membrane_usage, X):
+    capacities = {'Cytoplasm': (1.0, 0.5), 'Cell_membrane': (1.0, membrane_usage)}
+    return SimpleNamespace(
+        mu_opt=mu,
+        density_status=lambda c: capacities[c],
+        process_machinery_concentrations=lambda: {'P_TA': X[4], 'P_CHP': X[5]},
+        variables=dict(zip(COLUMNS, X)))
+
+
+# condition 0: ribosome binding, e1 and e2 binding (e2 more abundant)
+# condition 1: membrane full as well
+# condition 2: ribosome in excess, only e3 binding
+CONDITIONS = [
+    (0.0, 0.9, solution(10, 1.0, 0.1, 0.1, 0.2)),
+    (0.1, 1.0, solution(10, 1.0, 0.1, 0.1, 0.2)),
+    (0.2, 1.0, solution(10, 2.0, 0.2, 0.2, 0.1)),
+]
+
+
+def new_profile():
+    profile = AllocationProfile(
+        compartments=['Cytoplasm', 'Cell_membrane'], processes=['P_TA', 'P_CHP'],
+        enzymes=['e1', 'e2', 'e3'], top_enzymes=2)
+    for mu, membrane, X in CONDITIONS:
+        profile.record_solution(result(mu, membrane, X), FakeMatrix(), X)
+    return profile
+
+
+def check(profile):
+    assert profile.labels == ['0', '1', '2']
+    assert np.allclose(profile.table['mu'], [0, 0.1, 0.2])
+    assert profile.binding('density').tolist() == [
+        [False, False], [False, True], [False, True]]
+    assert profile.binding('machinery').tolist() == [
+        [True, False], [True, False], [False, False]]
+    assert profile.regime_changes().tolist() == [1, 2]
+    assert [e for e, _ in profile.bottlenecks(0)] == ['e1', 'e2']
+    assert profile.bottlenecks(2) == [('e3', pytest.approx(0.1))]
+    assert list(profile.frame('machinery').columns) == ['P_TA', 'P_CHP']
+    assert list(profile.frame().index) == profile.labels
+
+
+def test_row_usage():
+    X = solution(10, 2.0, 0.1, 0.2, 0.1)
+    usage = row_usage(FakeMatrix(), X)
+    # P_TA: slack 10 of scale 30; P_CHP: slack 9 of scale 11
+    assert np.allclose(usage, [1 - 10 / 30., 1 - 9 / 11., 1, 1 - 10 / 30., 1, 1])
+
+
+def test_record_and_query():
+    check(new_profile())
+
+
+def test_save_and_load(tmpdir):
+    file_name = str(tmpdir.join('profile.npz'))
+    new_profile().save(file_name)
+    check(AllocationProfile.load(file_name))
+
+
+def test_record_rebuilds_matrix_at_mu_opt(monkeypatch):
+    matrices = []
+
+    def constraint_matrix(model):
+        matrices.append(FakeMatrix(model))
+        return matrices[-1]
+
+    monkeypatch.setitem(sys.modules, 'rba', types.ModuleType('rba'))
+    monkeypatch.setitem(sys.modules, 'rba.core', types.ModuleType('rba.core'))
+    monkeypatch.setitem(
+        sys.modules, 'rba.core.constraint_matrix',
+        SimpleNamespace(ConstraintMatrix=constraint_matrix))
+    model = SimpleNamespace(medium={'M_glc': 10.0})
+    profile = AllocationProfile(
+        compartments=['Cytoplasm'], processes=['P_TA'], enzymes=['e1', 'e2', 'e3'])
+    mu, membrane, X = CONDITIONS[0]
+    profile.record(result(0.3, membrane, X), model, 'glc')
+    assert matrices[0].calls == [
+        ('set_medium', {'M_glc': 10.0}), ('build_matrices', 0.3)]
+    assert profile.labels == ['glc']
+    assert profile.binding('machinery').tolist() == [[True]]
@@ -0,0 +1,120 @@
+"""Tests for reading media and batched solving in batch_solve."""
+
+import sys
+import types
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_solve
+
+
+def write_medium(directory, name, concentrations):
+    lines = ['Metabolite\tConcentration']
+    lines += ['{}\t{}'.format(k, v) for k, v in concentrations.items()]
+    path = directory.join(name)
+    path.write('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def test_read_media(tmpdir):
+    files = [
+        write_medium(tmpdir, 'glc.tsv', {'M_glc': 10.0, 'M_nh4': 5.0}),
+        write_medium(tmpdir, 'ac.tsv', {'M_ac': 20.0, 'M_nh4': 1.0}),
+    ]
+    media = batch_solve.read_media(files)
+    assert list(media.columns) == files
+    assert media.loc['M_nh4'].tolist() == [5.0, 1.0]
+    # metabolites missing from one file are NaN in that condition
+    assert np.isnan(media.loc['M_ac', files[0]])
+    assert np.isnan(media.loc['M_glc', files[1]])
+
+    media = batch_solve.read_media(files, conditions=pd.Index(['glc', 'ac']))
+    assert list(media.columns) == ['glc', 'ac']
+    media = batch_solve.read_media(files, conditions=np.array(['glc', 'ac']))
+    assert list(media.columns) == ['glc', 'ac']
+
+
+class FakeMatrix(object):
+
+    instances = []
+
+    def __init__(self, model):
+        self.col_names = ['e1', 'R_a', 'P_TA', 'R_b', 'e2']
+        self.media = []
+        FakeMatrix.instances.append(self)
+
+    def set_medium(self, medium):
+        self.media.append(dict(medium))
+
+
+class FakeSolver(object):
+
+    # glucose concentration of the current medium sets growth rate,
+    # no glucose makes the problem infeasible
+    def __init__(self, matrix, **kwargs):
+        self.glc = matrix.media[-1]['M_glc']
+        self.X = None
+        self.mu_opt = 0
+
+    def solve(self):
+        if self.glc > 0:
+            self.mu_opt = self.glc / 10
+            self.X = np.array([1, 2, 3, 4, 5]) * self.glc
+
+
+@pytest.fixture
+def fake_rba(monkeypatch):
+    FakeMatrix.instances = []
+    modules = {
+        'rba': types.ModuleType('rba'),
+        'rba.core': types.ModuleType('rba.core'),
+        'rba.core.constraint_matrix': SimpleNamespace(ConstraintMatrix=FakeMatrix),
+        'rba.core.solver': SimpleNamespace(Solver=FakeSolver),
+    }
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+
+
+MODEL = SimpleNamespace(
+    medium={'M_glc': 10.0, 'M_nh4': 5.0},
+    metabolism=SimpleNamespace(reactions=[
+        SimpleNamespace(id='R_a'), SimpleNamespace(id='R_b')]),
+    enzymes=SimpleNamespace(enzymes=[
+        SimpleNamespace(id='e1'), SimpleNamespace(id='e2')]),
+)
+
+
+def test_solve_media(fake_rba):
+    media = pd.DataFrame(
+        {'low': [1.0, np.nan], 'none': [0.0, 1.0], 'high': [20.0, 1.0]},
+        index=['M_glc', 'M_nh4'], columns=['low', 'none', 'high'])
+    res = batch_solve.solve_media(MODEL, media)
+
+    # one matrix, medium set once per condition, base medium kept for NaN
+    assert len(FakeMatrix.instances) == 1
+    assert FakeMatrix.instances[0].media == [
+        {'M_glc': 1.0, 'M_nh4': 5.0},
+        {'M_glc': 0.0, 'M_nh4': 1.0},
+        {'M_glc': 20.0, 'M_nh4': 1.0},
+    ]
+    assert res.conditions == ['low', 'none', 'high']
+    assert res.reactions == ['R_a', 'R_b'] and res.enzymes == ['e1', 'e2']
+    assert np.allclose(res.mu_opt[[0, 2]], [0.1, 2.0])
+    assert np.allclose(res.fluxes[[0, 2]], [[2, 4], [40, 80]])
+    assert np.allclose(res.enzyme_concentrations[[0, 2]], [[1, 5], [20, 100]])
+
+    # failed condition
+    assert res.failed == ['none']
+    assert np.isnan(res.mu_opt[1])
+    assert np.all(np.isnan(res.fluxes[1]))
+    assert np.all(np.isnan(res.enzyme_concentrations[1]))
+
+
+def test_solve_media_rejects_unknown_metabolites(fake_rba):
+    media = pd.DataFrame({'c': [1.0, 2.0]}, index=['M_glc', 'M_glcc'])
+    with pytest.raises(ValueError, match='M_glcc'):
+        batch_solve.solve_media(MODEL, media)
+    assert FakeMatrix.instances == []
@@ -0,0 +1,84 @@
+"""Tests for ACHR sampling and k_app estimation in flux_sampling."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import flux_sampling
+
+
+def ref(species, stoichiometry=1.0):
+    return SimpleNamespace(species=species, stoichiometry=stoichiometry)
+
+
+def reaction(id_, reactants, products, reversible=False):
+    return SimpleNamespace(
+        id=id_, reversible=reversible,
+        reactants=[ref(s) for s in reactants], products=[ref(s) for s in products])
+
+
+# uptake of A, two branches A -> B -> C and A -> C, secretion of C
+METABOLISM = SimpleNamespace(
+    species=[
+        SimpleNamespace(id='A_e', boundary_condition=True),
+        SimpleNamespace(id='A', boundary_condition=False),
+        SimpleNamespace(id='B', boundary_condition=False),
+        SimpleNamespace(id='C', boundary_condition=False),
+    ],
+    reactions=[
+        reaction('up', ['A_e'], ['A']),
+        reaction('r1', ['A'], ['B']),
+        reaction('r2', ['A'], ['C']),
+        reaction('r3', ['B'], ['C']),
+        reaction('out', ['C'], []),
+    ],
+)
+
+
+def test_samples_are_feasible():
+    network = flux_sampling.stoichiometry(
+        METABOLISM, bounds={'up': (0, 10)}, default_bound=100)
+    samples = flux_sampling.sample_fluxes(
+        network, n_chains=4, n_samples=50, thinning=5, n_warmup=None, processes=1)
+    assert samples.shape == (5, 200)
+    assert np.all(np.isfinite(samples))
+    assert np.abs(network.S.dot(samples)).max() < 1e-6
+    assert np.all(samples >= network.lb[:, None] - 1e-6)
+    assert np.all(samples <= network.ub[:, None] + 1e-6)
+    # samples spread over the polytope
+    assert samples[0].max() - samples[0].min() > 1
+
+
+def test_pinned_network_does_not_produce_nan():
+    network = flux_sampling.stoichiometry(
+        METABOLISM, bounds={'up': (10, 10), 'r1': (4, 4)}, default_bound=100)
+    samples = flux_sampling.sample_fluxes(
+        network, n_chains=3, n_samples=10, thinning=5, n_warmup=None, processes=1)
+    assert np.all(np.isfinite(samples))
+    assert np.allclose(samples, [[10], [4], [6], [4], [10]], atol=1e-6)
+
+
+def test_parallel_sampling():
+    network = flux_sampling.stoichiometry(
+        METABOLISM, bounds={'up': (0, 10)}, default_bound=100)
+    samples = flux_sampling.sample_fluxes(
+        network, n_chains=4, n_samples=5, thinning=5, processes=2)
+    assert samples.shape == (5, 20)
+    assert np.all(np.isfinite(samples))
+
+
+def test_estimate_kapp_skips_capped_fluxes():
+    bounds = pd.DataFrame(
+        {'lower': [0, 0], 'median': [5, 500], 'upper': [10, 990]},
+        index=['r1', 'r2'])
+    enzyme = lambda r, subunits: SimpleNamespace(
+        id=r + '_enzyme', reaction=r,
+        machinery_composition=SimpleNamespace(
+            reactants=[ref(p, n) for p, n in subunits]))
+    model = SimpleNamespace(enzymes=SimpleNamespace(enzymes=[
+        enzyme('r1', [('P1', 2), ('P2', 1)]), enzyme('r2', [('P1', 1)])]))
+    kapp = flux_sampling.estimate_kapp(
+        model, bounds, {'P1': 0.004, 'P2': 0.001}, flux_cap=1000)
+    # abundance of r1_enzyme is limited by P2: min(0.004 / 2, 0.001)
+    assert kapp.to_dict() == {'r1_enzyme': 10 / 0.001}
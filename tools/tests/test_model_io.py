@@ -0,0 +1,153 @@
+"""Tests for overlays and change-only writing in model_io."""
+
+import gzip
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import model_io
+
+
+BASE = b"""<RBAParameters>
+  <listOfFunctions>
+    <function id="f1" type="constant"><listOfParameters><parameter id="CONSTANT" value="1"/></listOfParameters></function>
+    <function id="f2" type="constant"><listOfParameters><parameter id="CONSTANT" value="2"/></listOfParameters></function>
+    <function id="f3" type="constant"><listOfParameters><parameter id="CONSTANT" value="3"/></listOfParameters></function>
+  </listOfFunctions>
+  <listOfAggregates/>
+</RBAParameters>
+"""
+
+VARIANT = b"""<RBAParameters>
+  <listOfFunctions>
+    <function id="f1" type="constant"><listOfParameters><parameter id="CONSTANT" value="1"/></listOfParameters></function>
+    <function id="f2" type="constant"><listOfParameters><parameter id="CONSTANT" value="20"/></listOfParameters></function>
+    <function id="f4" type="constant"><listOfParameters><parameter id="CONSTANT" value="4"/></listOfParameters></function>
+  </listOfFunctions>
+  <listOfAggregates/>
+</RBAParameters>
+"""
+
+
+def ids(content):
+    return [e.get('id') for e in ET.fromstring(content).find('listOfFunctions')]
+
+
+def test_overlay_round_trip():
+    overlay = model_io.make_overlay(BASE, VARIANT)
+    # only the changed, added and removed functions are stored
+    assert ids(overlay) == ['f2', 'f4', 'f3']
+    restored = model_io.apply_overlay(BASE, overlay)
+    assert model_io.same_element(ET.fromstring(restored), ET.fromstring(VARIANT))
+    assert ids(restored) == ['f1', 'f2', 'f4']
+
+
+def test_overlay_keeps_position_of_inserted_elements():
+    variant = BASE.replace(
+        b'<function id="f2"',
+        b'<function id="f1b" type="constant"/>\n    <function id="f2"')
+    overlay = model_io.make_overlay(BASE, variant)
+    restored = model_io.apply_overlay(BASE, overlay)
+    assert ids(restored) == ['f1', 'f1b', 'f2', 'f3']
+    assert model_io.AFTER_ATTRIBUTE.encode() not in restored
+    assert model_io.same_element(ET.fromstring(restored), ET.fromstring(variant))
+
+
+def test_overlay_keeps_position_of_inserted_lists():
+    base = b'<RBAParameters><listOfFunctions/><listOfAggregates/></RBAParameters>'
+    variant = (b'<RBAParameters><listOfFunctions/><listOfExtra/>'
+               b'<listOfAggregates/></RBAParameters>')
+    restored = model_io.apply_overlay(base, model_io.make_overlay(base, variant))
+    assert [e.tag for e in ET.fromstring(restored)] == [
+        'listOfFunctions', 'listOfExtra', 'listOfAggregates']
+
+
+def test_identical_content_gives_no_overlay():
+    assert model_io.make_overlay(BASE, BASE) is None
+
+
+def test_write_if_changed(tmpdir):
+    directory = str(tmpdir)
+    assert model_io.write_if_changed(directory, 'parameters.xml', BASE, False)
+    mtime = os.path.getmtime(os.path.join(directory, 'parameters.xml'))
+    assert not model_io.write_if_changed(directory, 'parameters.xml', BASE, False)
+    assert os.path.getmtime(os.path.join(directory, 'parameters.xml')) == mtime
+
+    # switching to compression replaces the plain file
+    assert model_io.write_if_changed(directory, 'parameters.xml', BASE, True)
+    assert os.listdir(directory) == ['parameters.xml.gz']
+    with gzip.open(os.path.join(directory, 'parameters.xml.gz')) as f:
+        assert f.read() == BASE
+    assert not model_io.write_if_changed(directory, 'parameters.xml', BASE, True)
+    assert model_io.read_file(directory, 'parameters.xml') == BASE
+
+
+def test_restore_files_applies_overlay(tmpdir):
+    base_dir, overlay_dir, output_dir = [
+        str(tmpdir.mkdir(d)) for d in ['base', 'overlay', 'output']]
+    model_io.write_if_changed(base_dir, 'parameters.xml', BASE, True)
+    model_io.write_if_changed(base_dir, 'medium.tsv', b'Metabolite\tConcentration\n', False)
+    model_io.write_if_changed(
+        overlay_dir, 'parameters.xml', model_io.make_overlay(BASE, VARIANT), False)
+    model_io.restore_files(base_dir, output_dir, overlay_dir)
+    assert sorted(os.listdir(output_dir)) == ['medium.tsv', 'parameters.xml']
+    with open(os.path.join(output_dir, 'parameters.xml'), 'rb') as f:
+        assert ids(f.read()) == ['f1', 'f2', 'f4']
+
+
+class FakeModel(object):
+    """Stands in for RbaModel: writes fixed files like RbaModel.write()."""
+
+    def __init__(self, files, output_dir=None):
+        self.files = files
+        self.output_dir = output_dir
+
+    def write(self, output_dir):
+        for file_name, content in self.files.items():
+            with open(os.path.join(output_dir, file_name), 'wb') as f:
+                f.write(content)
+
+
+MEDIUM = b'Metabolite\tConcentration\nM_glc\t10.0\n'
+
+
+def test_rendered_files():
+    model = FakeModel({'parameters.xml': BASE, 'medium.tsv': MEDIUM})
+    assert model_io.rendered_files(model) == [
+        ('medium.tsv', MEDIUM), ('parameters.xml', BASE)]
+
+
+def test_write_model_only_rewrites_changed_files(tmpdir):
+    directory = str(tmpdir)
+    model = FakeModel({'parameters.xml': BASE, 'medium.tsv': MEDIUM}, directory)
+    assert model_io.write_model(model) == ['medium.tsv', 'parameters.xml']
+    assert model_io.write_model(model) == []
+
+    model.files['parameters.xml'] = VARIANT
+    assert model_io.write_model(model) == ['parameters.xml']
+    assert model_io.read_file(directory, 'parameters.xml') == VARIANT
+
+    # only XML files are compressed
+    assert model_io.write_model(model, compress=True) == ['parameters.xml']
+    assert sorted(os.listdir(directory)) == ['medium.tsv', 'parameters.xml.gz']
+
+
+def test_write_model_needs_output_dir():
+    with pytest.raises(ValueError):
+        model_io.write_model(FakeModel({'parameters.xml': BASE}))
+
+
+def test_write_overlay(tmpdir):
+    base_dir, overlay_dir = str(tmpdir.mkdir('base')), str(tmpdir.mkdir('overlay'))
+    model_io.write_model(FakeModel({'parameters.xml': BASE, 'medium.tsv': MEDIUM}, base_dir))
+
+    variant = FakeModel({'parameters.xml': VARIANT, 'medium.tsv': MEDIUM})
+    assert model_io.write_overlay(variant, base_dir, overlay_dir) == ['parameters.xml']
+    assert os.listdir(overlay_dir) == ['parameters.xml']
+    assert model_io.write_overlay(variant, base_dir, overlay_dir) == []
+
+    # variant identical to the base again: overlay file is removed
+    variant.files['parameters.xml'] = BASE
+    assert model_io.write_overlay(variant, base_dir, overlay_dir) == []
+    assert os.listdir(overlay_dir) == []